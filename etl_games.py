@@ -15,16 +15,19 @@ Vous pouvez le relancer autant de fois que nécessaire (ex: au démarrage du PC)
 
 import os
 import sys
+import math
 import time
-import json
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 
+import orjson
 import requests
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, TextClause
 from sqlalchemy.engine import Engine
 
 # =====================
@@ -70,6 +73,8 @@ def make_engine(cfg: Dict[str, str]) -> Engine:
     return engine
 
 
+UPSERT_BATCH_SIZE = 1000
+
 DDL_CREATE_TABLE = """
 CREATE TABLE IF NOT EXISTS `{table}` (
   `game_id` BIGINT NOT NULL,
@@ -88,11 +93,14 @@ CREATE TABLE IF NOT EXISTS `{table}` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 """
 
+# Pas de CAST(... AS JSON) dans VALUES : la colonne JSON convertit la chaîne
+# elle-même, et PyMySQL ne réécrit executemany() en INSERT multi-lignes que
+# si la clause VALUES ne contient que des placeholders.
 UPSERT_SQL = """
 INSERT INTO `{table}`
 (`game_id`, `title`, `platforms`, `genres`, `release_date`, `rating`, `source`, `raw_json`)
 VALUES
-(:game_id, :title, :platforms, :genres, :release_date, :rating, :source, CAST(:raw_json AS JSON))
+(:game_id, :title, :platforms, :genres, :release_date, :rating, :source, :raw_json)
 ON DUPLICATE KEY UPDATE
   `title` = VALUES(`title`),
   `platforms` = VALUES(`platforms`),
@@ -104,6 +112,12 @@ ON DUPLICATE KEY UPDATE
 """
 
 
+@lru_cache(maxsize=None)
+def upsert_stmt(table: str) -> TextClause:
+    """Statement UPSERT construit une seule fois par table (réutilisé à chaque appel)."""
+    return text(UPSERT_SQL.format(table=table))
+
+
 def ensure_table(engine: Engine, table: str) -> None:
     with engine.begin() as conn:
         conn.execute(text(DDL_CREATE_TABLE.format(table=table)))
@@ -114,8 +128,10 @@ def upsert_rows(engine: Engine, table: str, rows: List[Dict[str, Any]]) -> int:
     if not rows:
         return 0
     with engine.begin() as conn:
-        stmt = text(UPSERT_SQL.format(table=table))
-        conn.execute(stmt, rows)
+        stmt = upsert_stmt(table)
+        # Un INSERT étendu par lot (borné pour rester sous max_allowed_packet)
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            conn.execute(stmt, rows[i:i + UPSERT_BATCH_SIZE])
     return len(rows)
 
 
@@ -123,26 +139,17 @@ def upsert_rows(engine: Engine, table: str, rows: List[Dict[str, Any]]) -> int:
 # RAWG fetcher
 # =====================
 
-def rawg_fetch_latest(api_key: str, limit: int, timeout: int, retries: int) -> List[Dict[str, Any]]:
-    """
-    Récupère les derniers jeux sortis ou récemment référencés.
-    Docs RAWG: https://rawg.io/apidocs
-    Endpoint: GET /games?ordering=-released&page_size={limit}
-    """
-    if not api_key:
-        raise RuntimeError("RAWG_API_KEY manquant. Renseignez-le dans .env")
+RAWG_URL = "https://api.rawg.io/api/games"
+RAWG_PAGE_SIZE = 100  # taille demandée ; la taille réelle est lue sur la 1re page
+RAWG_MAX_WORKERS = 4
 
-    url = "https://api.rawg.io/api/games"
-    params = {
-        "key": api_key,
-        "page_size": min(max(limit, 1), 100),
-        "ordering": "-released",
-    }
 
+def _rawg_get_page(session: requests.Session, params: Dict[str, Any], timeout: int, retries: int) -> Dict[str, Any]:
+    """Récupère une page RAWG (avec retries et gestion du 429) et renvoie la réponse JSON."""
     last_exc: Optional[Exception] = None
     for attempt in range(1, retries + 1):
         try:
-            resp = requests.get(url, params=params, timeout=timeout)
+            resp = session.get(RAWG_URL, params=params, timeout=timeout)
             if resp.status_code == 429:
                 # Rate limit: attendre et retenter
                 wait = int(resp.headers.get("Retry-After", "10"))
@@ -150,36 +157,87 @@ def rawg_fetch_latest(api_key: str, limit: int, timeout: int, retries: int) -> L
                 time.sleep(wait)
                 continue
             resp.raise_for_status()
-            data = resp.json()
-            results = data.get("results", [])
-            normalized = []
-            for g in results[:limit]:
-                game_id = g.get("id")
-                title = g.get("name")
-                release_date = g.get("released") or None
-                platforms = ", ".join([p["platform"]["name"] for p in g.get("platforms", []) if p.get("platform")])
-                genres = ", ".join([p["name"] for p in g.get("genres", [])])
-                rating = g.get("rating")
-                normalized.append({
-                    "game_id": game_id,
-                    "title": title[:255] if title else None,
-                    "platforms": platforms[:255] if platforms else None,
-                    "genres": genres[:255] if genres else None,
-                    "release_date": release_date,
-                    "rating": rating,
-                    "source": "rawg",
-                    "raw_json": json.dumps(g, ensure_ascii=False),
-                })
-            return normalized
+            return resp.json()
         except Exception as e:
             last_exc = e
-            logging.error("Essai %d/%d échoué: %s", attempt, retries, e)
+            logging.error("Page %s — essai %d/%d échoué: %s", params.get("page"), attempt, retries, e)
             time.sleep(2 * attempt)
 
     assert last_exc is not None
     raise last_exc
 
 
+def _normalize_rawg_game(g: Dict[str, Any]) -> Dict[str, Any]:
+    """Convertit un jeu RAWG en ligne prête pour l'UPSERT."""
+    title = g.get("name")
+    platforms = ", ".join([p["platform"]["name"] for p in g.get("platforms") or [] if p.get("platform")])
+    genres = ", ".join([p["name"] for p in g.get("genres") or []])
+    return {
+        "game_id": g.get("id"),
+        "title": title[:255] if title else None,
+        "platforms": platforms[:255] if platforms else None,
+        "genres": genres[:255] if genres else None,
+        "release_date": g.get("released") or None,
+        "rating": g.get("rating"),
+        "source": "rawg",
+        "raw_json": orjson.dumps(g).decode("utf-8"),
+    }
+
+
+def rawg_fetch_latest(api_key: str, limit: int, timeout: int, retries: int) -> List[Dict[str, Any]]:
+    """
+    Récupère les derniers jeux sortis ou récemment référencés.
+    Docs RAWG: https://rawg.io/apidocs
+    Endpoint: GET /games?ordering=-released&page_size={page_size}&page={n}
+
+    La 1re page donne la taille de page réellement servie et le total (`count`) ;
+    les pages suivantes nécessaires pour atteindre `limit` sont demandées en
+    parallèle, jusqu'à ce que `limit` soit atteint ou qu'il n'y ait plus de page.
+    """
+    if not api_key:
+        raise RuntimeError("RAWG_API_KEY manquant. Renseignez-le dans .env")
+
+    if limit <= 0:
+        return []
+    base_params = {
+        "key": api_key,
+        "page_size": min(limit, RAWG_PAGE_SIZE),
+        "ordering": "-released",
+    }
+
+    def fetch(n: int) -> Dict[str, Any]:
+        return _rawg_get_page(session, {**base_params, "page": n}, timeout, retries)
+
+    with requests.Session() as session:
+        first = fetch(1)
+        results: List[Dict[str, Any]] = list(first.get("results") or [])
+        per_page = len(results)
+        count = first.get("count")
+        last_page = math.ceil(count / per_page) if count and per_page else None
+        has_next = bool(first.get("next"))
+        page = 1
+
+        with ThreadPoolExecutor(max_workers=RAWG_MAX_WORKERS) as ex:
+            while len(results) < limit and has_next and per_page:
+                wanted = math.ceil((limit - len(results)) / per_page)
+                if last_page is not None:
+                    wanted = min(wanted, last_page - page)
+                if wanted <= 0:
+                    break
+                datas = list(ex.map(fetch, range(page + 1, page + wanted + 1)))
+                fetched = [g for d in datas for g in d.get("results") or []]
+                if not fetched:
+                    break
+                results.extend(fetched)
+                page += wanted
+                has_next = bool(datas[-1].get("next"))
+
+    if len(results) < limit:
+        logging.warning("⚠️ RAWG: %d jeux disponibles pour %d demandés.", len(results), limit)
+    results = results[:limit]
+    return [_normalize_rawg_game(g) for g in results]
+
+
 
 # =====================
 # Optional: Web scraping
@@ -236,13 +294,8 @@ def main() -> int:
         scrape_rows = maybe_scrape_and_merge(limit)
         rows.extend(scrape_rows)
 
-        # Dedup by game_id keeping last
-        dedup = {}
-        for r in rows:
-            if r.get("game_id") is None:
-                # skip invalid rows
-                continue
-            dedup[r["game_id"]] = r
+        # Dedup by game_id keeping last (rows without game_id are skipped)
+        dedup = {r["game_id"]: r for r in rows if r.get("game_id") is not None}
         rows = list(dedup.values())
         logging.info("📦 Total à upserter: %d lignes après dédup.", len(rows))
 
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 Scraper configurable pour jeux vidéo.
-- Respecte robots.txt (lecture simple)
+- Respecte robots.txt (RobotFileParser, lu une fois par hôte, vérifié pour chaque URL de liste)
 - User-Agent propre
 - Retries et timeouts
 - Parsers basés sur des sélecteurs CSS pour extraire: title, platform(s), genres, release_date, rating (si dispo), game_id (hash si absent)
@@ -12,51 +12,85 @@ Usage:
     rows = scrape_all_sources("scrape_sources.json", limit_per_source=50)
 """
 
-import json
+import os
+import copy
 import time
 import hashlib
-from dataclasses import dataclass
-from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional, Tuple
 from urllib.parse import urlparse, urljoin
+from urllib.robotparser import RobotFileParser
+from pathlib import Path
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, Tag
 
 DEFAULT_UA = "GameETLBot/1.0 (+https://example.local/etl)"
 DEFAULT_TIMEOUT = 20
 DEFAULT_RETRIES = 3
 PAUSE_BETWEEN_REQUESTS = 1.0  # politeness
+MAX_WORKERS = 8  # hosts scraped in parallel (one worker per host)
+TEXT_FIELDS = ("title", "platforms", "genres", "release_date", "rating")
 
-@dataclass
+# Shared keep-alive session: reuses TCP/TLS connections across requests
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": DEFAULT_UA})
+_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=0)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+@dataclass(frozen=True)
 class SourceCfg:
+    # Immutable: instances are shared through the load_sources cache
     name: str
     base_url: str
-    list_urls: List[str]
+    list_urls: Tuple[str, ...]
     item_selector: str
-    fields: Dict[str, str]  # CSS selectors for fields
-    constant_fields: Dict[str, str]  # constant values to add (e.g., platform)
-
-def _allowed_by_robots(base_url: str, user_agent: str = "*") -> bool:
-    """Very simple robots.txt check. If fetch fails, defaults to True."""
+    fields: Mapping[str, str]  # CSS selectors for fields
+    constant_fields: Mapping[str, str]  # constant values to add (e.g., platform)
+    # Precomputed from `fields` once, so parse_list_page doesn't re-look them up per item
+    compiled_fields: Tuple[Tuple[str, str], ...] = field(init=False, repr=False)
+    link_selector: Optional[str] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "list_urls", tuple(self.list_urls))
+        object.__setattr__(self, "fields", MappingProxyType(dict(self.fields)))
+        object.__setattr__(self, "constant_fields", MappingProxyType(dict(self.constant_fields)))
+        object.__setattr__(self, "compiled_fields",
+                           tuple((f, self.fields[f]) for f in TEXT_FIELDS if f in self.fields))
+        object.__setattr__(self, "link_selector", self.fields.get("link") or None)
+
+@lru_cache(maxsize=None)
+def _robots_parser(robots_url: str) -> Optional[RobotFileParser]:
+    """Fetch and parse robots.txt once per host. None if unavailable."""
     try:
-        parsed = urlparse(base_url)
-        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-        r = requests.get(robots_url, timeout=10, headers={"User-Agent": DEFAULT_UA})
+        r = SESSION.get(robots_url, timeout=10)
         if r.status_code != 200:
-            return True
-        disallow_lines = [line.split(":")[1].strip()
-                          for line in r.text.splitlines()
-                          if line.lower().startswith("disallow:")]
-        # naive allow: if homepage "/" disallowed, skip
-        return "/" not in disallow_lines
+            return None
+        rp = RobotFileParser(robots_url)
+        rp.parse(r.text.splitlines())
+        return rp
     except Exception:
+        return None
+
+def _allowed_by_robots(url: str, user_agent: str = DEFAULT_UA) -> bool:
+    """robots.txt check for `url`. If robots.txt can't be fetched, defaults to True."""
+    parsed = urlparse(url)
+    rp = _robots_parser(f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+    if rp is None:
         return True
+    return rp.can_fetch(user_agent, url)
 
 def _get(url: str, retries: int = DEFAULT_RETRIES, timeout: int = DEFAULT_TIMEOUT) -> Optional[requests.Response]:
     last_exc = None
     for attempt in range(1, retries + 1):
         try:
-            resp = requests.get(url, timeout=timeout, headers={"User-Agent": DEFAULT_UA})
+            resp = SESSION.get(url, timeout=timeout)
             resp.raise_for_status()
             return resp
         except Exception as e:
@@ -72,7 +106,14 @@ def _text_or_none(node) -> Optional[str]:
     t = node.get_text(strip=True)
     return t or None
 
-def _select_text(soup: BeautifulSoup, selector: str) -> Optional[str]:
+def _detached(item: Tag) -> BeautifulSoup:
+    """Copy of `item` alone in an empty document: selectors see neither its
+    ancestors nor its siblings, and may match the item itself."""
+    w = BeautifulSoup("", "html.parser")
+    w.append(copy.copy(item))
+    return w
+
+def _select_text(soup: Tag, selector: str) -> Optional[str]:
     if not selector:
         return None
     el = soup.select_one(selector)
@@ -80,9 +121,8 @@ def _select_text(soup: BeautifulSoup, selector: str) -> Optional[str]:
 
 def _hash_id(parts: List[Optional[str]]) -> int:
     data = "|".join([p or "" for p in parts]).encode("utf-8")
-    h = hashlib.sha256(data).hexdigest()[:16]
-    # convert hex to int for storage as BIGINT (within range using a slice)
-    return int(h, 16) % (2**63 - 1)
+    # first 8 digest bytes as a BIGINT (same value as the former hexdigest()[:16] slice)
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "big") % (2**63 - 1)
 
 def parse_list_page(html: str, cfg: SourceCfg) -> List[Dict[str, Any]]:
     soup = BeautifulSoup(html, "html.parser")
@@ -90,23 +130,21 @@ def parse_list_page(html: str, cfg: SourceCfg) -> List[Dict[str, Any]]:
     results: List[Dict[str, Any]] = []
 
     for item in items:
-        # Build a minimal soup for extraction (the item itself)
-        s = BeautifulSoup(str(item), "html.parser")
-        title = None
-        if "title" in cfg.fields:
-            title = _select_text(s, cfg.fields["title"])
+        # Minimal document for extraction (the item itself), without re-parsing its HTML
+        s = _detached(item)
+        vals = {fname: _select_text(s, sel) for fname, sel in cfg.compiled_fields}
+        title = vals.get("title")
         # Try link href for id
         href = None
-        link_sel = cfg.fields.get("link")
-        if link_sel:
-            link_el = s.select_one(link_sel)
+        if cfg.link_selector:
+            link_el = s.select_one(cfg.link_selector)
             if link_el and link_el.has_attr("href"):
                 href = link_el["href"]
 
-        platforms = _select_text(s, cfg.fields.get("platforms", "")) if "platforms" in cfg.fields else None
-        genres = _select_text(s, cfg.fields.get("genres", "")) if "genres" in cfg.fields else None
-        release_date = _select_text(s, cfg.fields.get("release_date", "")) if "release_date" in cfg.fields else None
-        rating = _select_text(s, cfg.fields.get("rating", "")) if "rating" in cfg.fields else None
+        platforms = vals.get("platforms")
+        genres = vals.get("genres")
+        release_date = vals.get("release_date")
+        rating = vals.get("rating")
         # normalize rating to float if possible
         rating_val = None
         if rating:
@@ -142,6 +180,8 @@ def scrape_source(cfg: SourceCfg, limit: int = 50) -> List[Dict[str, Any]]:
 
     out: List[Dict[str, Any]] = []
     for url in cfg.list_urls:
+        if not _allowed_by_robots(url):
+            continue
         resp = _get(url)
         time.sleep(PAUSE_BETWEEN_REQUESTS)
         rows = parse_list_page(resp.text, cfg)
@@ -151,7 +191,12 @@ def scrape_source(cfg: SourceCfg, limit: int = 50) -> List[Dict[str, Any]]:
     return out[:limit]
 
 def load_sources(path: str) -> List[SourceCfg]:
-    data = json.load(open(path, "r", encoding="utf-8"))
+    # Parsed config is reused until the file changes on disk
+    return list(_load_sources_cached(path, os.stat(path).st_mtime_ns))
+
+@lru_cache(maxsize=8)
+def _load_sources_cached(path: str, mtime_ns: int) -> Tuple[SourceCfg, ...]:
+    data = orjson.loads(Path(path).read_bytes())
     cfgs: List[SourceCfg] = []
     for s in data.get("sources", []):
         cfgs.append(SourceCfg(
@@ -162,16 +207,32 @@ def load_sources(path: str) -> List[SourceCfg]:
             fields=s.get("fields", {}),
             constant_fields=s.get("constant_fields", {}),
         ))
-    return cfgs
+    return tuple(cfgs)
 
-def scrape_all_sources(config_path: str, limit_per_source: int = 50) -> List[Dict[str, Any]]:
-    rows: List[Dict[str, Any]] = []
-    cfgs = load_sources(config_path)
-    for cfg in cfgs:
+def _scrape_host(cfgs: List[Tuple[int, SourceCfg]], limit: int) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """Scrape the sources of one host one after the other, so the politeness pause holds per host."""
+    parts = []
+    for idx, cfg in cfgs:
         try:
-            part = scrape_source(cfg, limit=limit_per_source)
-            rows.extend(part)
-        except Exception as e:
+            parts.append((idx, scrape_source(cfg, limit=limit)))
+        except Exception:
             # continue on error per source
-            continue
-    return rows
+            parts.append((idx, []))
+    return parts
+
+def scrape_all_sources(config_path: str, limit_per_source: int = 50) -> List[Dict[str, Any]]:
+    cfgs = load_sources(config_path)
+    if not cfgs:
+        return []
+    # One worker per host: different hosts run in parallel, sources sharing a
+    # host stay sequential with PAUSE_BETWEEN_REQUESTS between their requests
+    by_host: Dict[str, List[Tuple[int, SourceCfg]]] = {}
+    for idx, cfg in enumerate(cfgs):
+        by_host.setdefault(urlparse(cfg.base_url).netloc, []).append((idx, cfg))
+    parts: List[List[Dict[str, Any]]] = [[] for _ in cfgs]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(by_host))) as ex:
+        for host_parts in ex.map(lambda group: _scrape_host(group, limit_per_source), by_host.values()):
+            for idx, part in host_parts:
+                parts[idx] = part
+    # keep the configuration order
+    return [row for part in parts for row in part]